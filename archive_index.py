@@ -0,0 +1,191 @@
+"""Integrity scanner and snapshot index for data/archive.
+
+Every archived `<output_name>_YYYYMMDD_HHMMSS.xlsx` is checked in a process
+pool: zip CRCs (`ZipFile.testzip`), the sheets `schemas.py` requires for that
+workbook, and the number of non-empty data rows in each required sheet (in
+every sheet for workbooks with no registered schema). The results go to
+`data/archive/index.json`:
+
+    {"snapshots": {output_name: [entry, ...]},   # sorted by timestamp
+     "timestamps": {output_name: [iso, ...]},    # same order, for bisecting
+     "bad": [filename, ...],                     # corrupt / unreadable
+     "schema_mismatch": [filename, ...]}         # readable, required sheet missing
+
+where each entry holds file, timestamp, size, sha256, sheets, rows, errors,
+schema_issues, ok and schema_ok. Scans are incremental: files already
+indexed with the same size are not reopened, and entries for files that no
+longer exist (e.g. thinned by retention.py) are dropped.
+
+    python archive_index.py                         # update the index
+    python archive_index.py --full                  # re-verify every file
+    python archive_index.py --as-of Postdocs 2025-09-01
+"""
+import argparse
+import bisect
+import datetime as dt
+import difflib
+import hashlib
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from retention import ARCHIVE_DIR, parse_version
+from schemas import expected_sheets
+
+INDEX_FILE = ARCHIVE_DIR / "index.json"
+
+
+def scan_file(path: str) -> dict:
+    """Verify one workbook. Runs in a worker process; never raises."""
+    p = Path(path)
+    output_name, ts = parse_version(p)
+    entry = {
+        "file": p.name,
+        "output_name": output_name,
+        "timestamp": ts.isoformat(),
+        "size": None,
+        "sha256": None,
+        "sheets": [],
+        "rows": {},
+        "errors": [],
+        "schema_issues": [],
+    }
+    try:
+        data = p.read_bytes()
+        entry["size"] = len(data)
+        entry["sha256"] = hashlib.sha256(data).hexdigest()
+    except OSError as e:
+        entry["errors"].append(f"unreadable file: {e}")
+        entry["ok"] = entry["schema_ok"] = False
+        return entry
+    try:
+        with zipfile.ZipFile(p) as zf:
+            bad = zf.testzip()
+        if bad is not None:
+            entry["errors"].append(f"CRC mismatch in {bad}")
+    except Exception as e:
+        # BadZipFile for truncated files; zlib.error/EOFError for damaged members.
+        entry["errors"].append(f"not a valid xlsx: {e}")
+
+    if not entry["errors"]:
+        import warnings
+        import openpyxl
+        warnings.filterwarnings("ignore", category=UserWarning)
+        try:
+            wb = openpyxl.load_workbook(p, read_only=True, data_only=True)
+            try:
+                entry["sheets"] = list(wb.sheetnames)
+                # Unregistered workbooks have nothing to check, but their row
+                # counts are still worth tracking.
+                for sheet_name in expected_sheets(p) or wb.sheetnames:
+                    if sheet_name not in wb.sheetnames:
+                        hint = difflib.get_close_matches(sheet_name, wb.sheetnames, n=1)
+                        entry["schema_issues"].append(f"required sheet '{sheet_name}' missing"
+                                                      + (f" (did you mean '{hint[0]}'?)" if hint else ""))
+                        continue
+                    rows = wb[sheet_name].iter_rows(values_only=True)
+                    next(rows, None)  # header
+                    entry["rows"][sheet_name] = sum(1 for r in rows if any(v is not None for v in r))
+            finally:
+                wb.close()
+        except Exception as e:
+            entry["errors"].append(f"unreadable workbook: {e}")
+
+    entry["ok"] = not entry["errors"]
+    entry["schema_ok"] = not entry["schema_issues"]
+    return entry
+
+
+def load_index(index_file: Path = INDEX_FILE) -> dict:
+    try:
+        return json.loads(index_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"snapshots": {}, "timestamps": {}, "bad": [], "schema_mismatch": []}
+
+
+def update_index(archive_dir: Path = ARCHIVE_DIR, index_file: Path = INDEX_FILE,
+                 full: bool = False, workers: int | None = None) -> dict:
+    """Scan new or changed archive files in parallel and rewrite the index."""
+    index = load_index(index_file)
+    known = {e["file"]: e for entries in index["snapshots"].values() for e in entries}
+
+    present = {p.name: p for p in Path(archive_dir).glob("*.xlsx") if parse_version(p)}
+    to_scan = [str(p) for name, p in sorted(present.items())
+               if full or name not in known or known[name]["size"] != p.stat().st_size]
+
+    entries = {name: e for name, e in known.items() if name in present}
+    if to_scan:
+        print(f"[*] Scanning {len(to_scan)} of {len(present)} archived file(s)...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for entry in pool.map(scan_file, to_scan, chunksize=4):
+                entries[entry["file"]] = entry
+    else:
+        print(f"[*] Archive index up to date ({len(present)} files)")
+
+    snapshots = {}
+    for e in entries.values():
+        snapshots.setdefault(e["output_name"], []).append(e)
+    for group in snapshots.values():
+        group.sort(key=lambda e: e["timestamp"])
+    index = {
+        "snapshots": dict(sorted(snapshots.items())),
+        "timestamps": {name: [e["timestamp"] for e in group] for name, group in sorted(snapshots.items())},
+        "bad": sorted(name for name, e in entries.items() if not e["ok"]),
+        "schema_mismatch": sorted(name for name, e in entries.items() if e["ok"] and not e["schema_ok"]),
+    }
+
+    tmp_file = index_file.with_name(index_file.name + ".tmp")
+    tmp_file.write_text(json.dumps(index, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp_file, index_file)
+    for name in index["bad"]:
+        print(f"[X] Bad snapshot: {name}: {'; '.join(entries[name]['errors'])}")
+    for name in index["schema_mismatch"]:
+        print(f"[!] Schema mismatch: {name}: {'; '.join(entries[name]['schema_issues'])}")
+    return index
+
+
+def snapshot_as_of(index: dict, output_name: str, when: dt.datetime,
+                   include_bad: bool = False) -> dict | None:
+    """Newest indexed snapshot of `output_name` taken at or before `when`.
+
+    Corrupt snapshots are skipped unless `include_bad` is set.
+    """
+    group = index["snapshots"].get(output_name, [])
+    i = bisect.bisect_right(index["timestamps"].get(output_name, []), when.isoformat())
+    while i and not (include_bad or group[i - 1]["ok"]):
+        i -= 1
+    return group[i - 1] if i else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify data/archive and maintain its snapshot index.")
+    parser.add_argument("--full", action="store_true", help="re-verify files that are already indexed")
+    parser.add_argument("--workers", type=int, help="process pool size (default: CPU count)")
+    parser.add_argument("--as-of", nargs=2, metavar=("OUTPUT_NAME", "YYYY-MM-DD"),
+                        help="print the snapshot in effect on a date instead of scanning")
+    args = parser.parse_args(argv)
+
+    if args.as_of:
+        name, date = args.as_of
+        when = dt.datetime.fromisoformat(date)
+        if when.time() == dt.time():
+            when = when.replace(hour=23, minute=59, second=59)
+        entry = snapshot_as_of(load_index(), name, when)
+        if entry is None:
+            print(f"[X] No {name} snapshot on or before {date}")
+            return 1
+        print(json.dumps(entry, indent=1))
+        return 0
+
+    index = update_index(full=args.full, workers=args.workers)
+    total = sum(len(g) for g in index["snapshots"].values())
+    print(f"[+] Indexed {total} snapshot(s); {len(index['bad'])} corrupt, "
+          f"{len(index['schema_mismatch'])} with schema mismatches")
+    return 1 if index["bad"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Cold-start import cost of each pipeline entry point.
+
+Imports every entry-point module in a fresh interpreter under
+`python -X importtime` and reports the cumulative import time of the module
+itself plus the heaviest third-party packages it pulled in. Taking the median
+of several runs smooths out disk-cache noise.
+
+Run locally:  python bench_startup.py
+              python bench_startup.py --repeat 7 --record   # append to data/metrics_history.jsonl
+              python bench_startup.py --budget-ms 50        # exit 1 if any entry point exceeds it
+
+`--record` appends to the same history as pipeline runs (metrics.HISTORY_FILE)
+a line of the form {"stage": "startup", "started_at", "import_ms": {module: ms},
+"heavy_import_ms": {module: {package: ms}}}. The workflow records one on every
+run that commits.
+"""
+import argparse
+import datetime as dt
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from metrics import HISTORY_FILE, append_history
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+ENTRY_POINTS = ["pipeline", "build_stats", "download_delegated", "download_upload"]
+# Packages worth calling out when they show up at import time.
+HEAVY = ["openpyxl", "requests", "msal"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds per top-level package for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        if cumulative.isdigit() and (name == module or name in HEAVY):
+            out[name] = int(cumulative)
+    return out
+
+
+def bench(module: str, repeat: int) -> dict:
+    runs = [import_times(module) for _ in range(repeat)]
+    names = {n for r in runs for n in r}
+    return {n: round(statistics.median(r.get(n, 0) for r in runs) / 1000, 2) for n in sorted(names)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--record", action="store_true", help="append results to data/metrics_history.jsonl")
+    parser.add_argument("--budget-ms", type=float, help="fail if an entry point's import exceeds this")
+    args = parser.parse_args(argv)
+
+    results, over = {}, []
+    for module in ENTRY_POINTS:
+        try:
+            ms = bench(module, args.repeat)
+        except RuntimeError as e:
+            print(f"[!] {e}")
+            continue
+        results[module] = ms
+        heavy = ", ".join(f"{n} {v:.1f} ms" for n, v in ms.items() if n != module) or "none"
+        print(f"[*] {module:<20} {ms.get(module, 0):8.1f} ms   (heavy: {heavy})")
+        if args.budget_ms is not None and ms.get(module, 0) > args.budget_ms:
+            over.append(module)
+
+    if args.record:
+        append_history({
+            "stage": "startup",
+            "started_at": dt.datetime.now(dt.UTC).isoformat(timespec="seconds"),
+            "import_ms": {m: r.get(m, 0) for m, r in results.items()},
+            "heavy_import_ms": {m: {n: v for n, v in r.items() if n != m} for m, r in results.items()},
+        })
+        print(f"[*] Recorded in {HISTORY_FILE}")
+
+    if over:
+        print(f"[X] Over {args.budget_ms} ms budget: {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,44 +9,176 @@ Reads the daily-refreshed `_latest.xlsx` files in ./data/ and emits
   every published measure is derivable).
 - `meta`: source filenames, generated_at, and counts for quick sanity checks.
 
-Run locally:  python build_stats.py
+The same data is also split into `data/stats/<dataset>.json` (one JSON array
+per key of `rows`) and `data/stats/index.json`, which carries generated_at,
+source_files, measures_static, meta.summary and, per shard, its file name,
+row count, byte size and sha256. Views that only need headline numbers read
+the index alone and fetch shards on demand.
+
+Before any rows are parsed, every source sheet's header row is checked
+against the registry in `schemas.py`; missing columns fail the build and the
+result is written to `data/schema_report.json`.
+
+Timings for each sheet read, extractor and the JSON write are recorded via
+`metrics.py`: standalone runs write `data/metrics_build_latest.json`; under
+pipeline.py they are part of `metrics/metrics_pipeline_latest.json`, with a
+summary line in `data/metrics_history.jsonl` on runs that commit.
+
+`--stream` builds the same file in one pass without holding the rows in
+memory (see `stream_build`); use it once the workbooks grow large.
+
+Run locally:  python build_stats.py [--stream]
 In CI:        invoked from .github/workflows/download-excel.yml after the
               download step succeeds.
 """
 import datetime as dt
+import hashlib
 import json
+import os
 import re
 import sys
 import warnings
+from collections import Counter, defaultdict
 from pathlib import Path
+from typing import Iterator
 
-import openpyxl
+from metrics import emit as emit_metrics, incr, span
+from schemas import SchemaError, check_header, describe_failure, expected_sheets
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 OUT_FILE = DATA_DIR / "stats_latest.json"
+# One file per dataset under rows, plus index.json (summary + shard sizes/hashes)
+# so the dashboard can render headline numbers before fetching any rows.
+SHARD_DIR = DATA_DIR / "stats"
+INDEX_FILE = SHARD_DIR / "index.json"
+SCHEMA_REPORT_FILE = DATA_DIR / "schema_report.json"
+
+# Workbooks read by the extractors below; pipeline.py hashes these to decide
+# whether the build stage can be skipped.
+SOURCE_FILES = {
+    "fellows": "Cohort_1_11_Demographics_latest.xlsx",
+    "postdocs": "Postdocs_latest.xlsx",
+    "grants": "Extra Grants_latest.xlsx",
+    "institutionalization": "Institutionalization_latest.xlsx",
+}
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
+def iter_sheet(xlsx_path: Path, sheet_name: str, aliases: dict | None = None, wb=None) -> Iterator[dict]:
+    """Yield one dict per non-empty row of the named sheet, keyed by trimmed header.
+
+    `aliases` is the sheet's alias map from validate_sources(); when given the
+    header is not checked again. Without it the header is checked here. Pass an
+    open workbook as `wb` to read several sheets from one load (the caller
+    closes it).
+
+    The `read_sheet` span times only opening the workbook and reading the
+    header; row parsing happens at the caller's pace, so the row count is
+    recorded as the `rows.<file>.<sheet>` counter once iteration finishes.
+    """
+    # openpyxl costs ~100 ms to import; load it only once a sheet is actually read
+    # so a skipped build (see pipeline.py) never pays for it.
+    import openpyxl
+
+    own_wb = wb is None
+    try:
+        with span("read_sheet", file=xlsx_path.name, sheet=sheet_name):
+            if own_wb:
+                wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+            if sheet_name not in wb.sheetnames:
+                raise KeyError(f"{xlsx_path.name}: sheet '{sheet_name}' missing. Have: {wb.sheetnames}")
+            ws = wb[sheet_name]
+            rows = ws.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else "" for h in next(rows)]
+            if aliases is None:
+                report = check_header(xlsx_path, sheet_name, header)
+                if not report["ok"]:
+                    raise SchemaError(describe_failure(report))
+                aliases = report["aliases"]
+            header = [aliases.get(h, h) for h in header]
+        n = 0
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            n += 1
+            yield {h: v for h, v in zip(header, row) if h}
+        incr(f"rows.{xlsx_path.stem}.{sheet_name}", n)
+    finally:
+        if own_wb and wb is not None:
+            wb.close()
+
+
+def _aliases(checked: dict | None, xlsx_path: Path, sheet_name: str) -> dict | None:
+    """The alias map validate_sources() recorded for a sheet, or None if unchecked."""
+    report = (checked or {}).get((xlsx_path.name, sheet_name))
+    return report["aliases"] if report else None
+
+
 def read_sheet(xlsx_path: Path, sheet_name: str) -> list[dict]:
     """Return a list of dicts from the named sheet, keyed by trimmed header."""
-    wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
-    if sheet_name not in wb.sheetnames:
-        raise KeyError(f"{xlsx_path.name}: sheet '{sheet_name}' missing. Have: {wb.sheetnames}")
-    ws = wb[sheet_name]
-    rows = ws.iter_rows(values_only=True)
-    header = [str(h).strip() if h is not None else "" for h in next(rows)]
-    out = []
-    for row in rows:
-        if all(v is None for v in row):
-            continue
-        out.append({h: v for h, v in zip(header, row) if h})
-    wb.close()
-    return out
+    return list(iter_sheet(xlsx_path, sheet_name))
+
+
+def validate_sources(report_file: Path = SCHEMA_REPORT_FILE) -> dict[tuple[str, str], dict]:
+    """Check every registered sheet's header row before any rows are parsed.
+
+    Writes a validation report (fingerprints, aliases, missing columns with
+    suggestions, and whether a fingerprint changed since the last report) and
+    raises SchemaError if any required sheet or column is missing. Returns the
+    per-sheet reports keyed by (filename, sheet); the extractors take this so
+    iter_sheet applies the aliases without checking each header again.
+    """
+    import openpyxl
+
+    try:
+        previous = {(r["file"], r["sheet"]): r["fingerprint"]
+                    for r in json.loads(report_file.read_text(encoding="utf-8"))["sheets"]}
+    except (OSError, ValueError, KeyError):
+        previous = {}
+
+    reports = []
+    with span("schema.validate") as s:
+        for filename in SOURCE_FILES.values():
+            xlsx_path = DATA_DIR / filename
+            wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+            try:
+                for sheet_name in expected_sheets(xlsx_path):
+                    if sheet_name not in wb.sheetnames:
+                        reports.append({"file": filename, "sheet": sheet_name, "ok": False,
+                                        "sheet_missing": wb.sheetnames})
+                        continue
+                    first = next(wb[sheet_name].iter_rows(values_only=True, max_row=1), ())
+                    header = [str(h).strip() if h is not None else "" for h in first]
+                    report = check_header(xlsx_path, sheet_name, header)
+                    prev = previous.get((filename, sheet_name))
+                    report["fingerprint_changed"] = prev is not None and prev != report["fingerprint"]
+                    reports.append(report)
+            finally:
+                wb.close()
+        s["sheets"] = len(reports)
+
+    failures = [r for r in reports if not r["ok"]]
+    report_file.write_text(json.dumps({
+        "checked_at": dt.datetime.now(dt.UTC).isoformat(timespec="seconds"),
+        "ok": not failures,
+        "sheets": reports,
+    }, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    for r in reports:
+        if r.get("aliases"):
+            print(f"  [!] {r['file']} / {r['sheet']}: matched by case/spacing only: {r['aliases']}")
+        if r.get("fingerprint_changed"):
+            print(f"  [!] {r['file']} / {r['sheet']}: header layout changed since last build")
+    if failures:
+        raise SchemaError("Source schema check failed (see "
+                          f"{report_file.name}):\n  " + "\n  ".join(describe_failure(r) for r in failures))
+    print(f"  Schema check: {len(reports)} sheets OK")
+    return {(r["file"], r["sheet"]): r for r in reports}
 
 
 def to_int(v, default=None):
@@ -157,12 +289,13 @@ def normalize_duty(v: str | None) -> str:
 # ---------------------------------------------------------------------------
 
 
-def load_fellows() -> list[dict]:
-    """Use the cohort 1-11 demographics file (most complete)."""
-    src = DATA_DIR / "Cohort_1_11_Demographics_latest.xlsx"
-    rows = read_sheet(src, "Fellows")
-    out = []
-    for r in rows:
+def iter_fellows(checked: dict | None = None) -> Iterator[dict]:
+    """Use the cohort 1-11 demographics file (most complete).
+
+    `checked` is validate_sources()'s result, here and in the other extractors.
+    """
+    src = DATA_DIR / SOURCE_FILES["fellows"]
+    for r in iter_sheet(src, "Fellows", _aliases(checked, src, "Fellows")):
         unique_id = r.get("Unique ID")
         if not unique_id:
             continue
@@ -171,7 +304,7 @@ def load_fellows() -> list[dict]:
         # but no actual fellow name. A real fellow always has a first name or surname.
         if not (r.get("First Name") or r.get("Surname")):
             continue
-        out.append({
+        yield {
             "id": str(unique_id),
             "gender": normalize_gender(r.get("Gender")),
             "cohort": to_int(r.get("Cohort")),
@@ -196,17 +329,19 @@ def load_fellows() -> list[dict]:
                 1 for k in ("Month/ Year JAS1", "Month/ Year JAS2", "Month/ Year JAS3", "Month/ Year JAS4")
                 if r.get(k) not in (None, "")
             ),
-        })
-    return out
+        }
+
+
+def load_fellows(checked: dict | None = None) -> list[dict]:
+    return list(iter_fellows(checked))
 
 
-def load_postdocs() -> list[dict]:
-    rows = read_sheet(DATA_DIR / "Postdocs_latest.xlsx", "Post Doc")
-    out = []
-    for r in rows:
+def iter_postdocs(checked: dict | None = None) -> Iterator[dict]:
+    src = DATA_DIR / SOURCE_FILES["postdocs"]
+    for r in iter_sheet(src, "Post Doc", _aliases(checked, src, "Post Doc")):
         if not r.get("Unique ID") and not r.get("Name of Awardee"):
             continue
-        out.append({
+        yield {
             "id": str(r.get("Unique ID") or ""),
             "sex": normalize_gender(r.get("Sex")),
             "institution_employment": (r.get("Institution of employment at the time of award") or "").strip() or None,
@@ -216,19 +351,21 @@ def load_postdocs() -> list[dict]:
             "year_completion": to_year(r.get("Year of Completion")),
             "status": normalize_status(r.get("Status (Active/Completed")),
             "funder": (r.get("Funder") or "").strip() or None,
-        })
-    return out
+        }
+
+
+def load_postdocs(checked: dict | None = None) -> list[dict]:
+    return list(iter_postdocs(checked))
 
 
-def load_grants() -> list[dict]:
-    rows = read_sheet(DATA_DIR / "Extra Grants_latest.xlsx", "Extra Grants")
-    out = []
-    for r in rows:
+def iter_grants(checked: dict | None = None) -> Iterator[dict]:
+    src = DATA_DIR / SOURCE_FILES["grants"]
+    for r in iter_sheet(src, "Extra Grants", _aliases(checked, src, "Extra Grants")):
         amount = to_float(r.get("Total amount in $"))
         if amount is None:
             # Power BI sums by amount; drop rows we can't sum. Counts already preserved upstream.
             continue
-        out.append({
+        yield {
             "sex": normalize_gender(r.get("Sex")),
             "cohort": to_int(r.get("Cohort Number")),
             "institution": (r.get("Institution of employment at registration") or "").strip() or None,
@@ -237,43 +374,64 @@ def load_grants() -> list[dict]:
             "amount_usd": amount,
             "funder": (r.get("Name of Funder") or "").strip() or None,
             "duration_months": to_int(r.get("Duration of Funding (in months)")),
-        })
-    return out
+        }
 
 
-def load_trainings():
-    src = DATA_DIR / "Institutionalization_latest.xlsx"
+def load_grants(checked: dict | None = None) -> list[dict]:
+    return list(iter_grants(checked))
+
+
+def _iter_training_sheet(src: Path, sheet_name: str, source_tag: str,
+                         checked: dict | None = None, wb=None) -> Iterator[dict]:
+    for r in iter_sheet(src, sheet_name, _aliases(checked, src, sheet_name), wb=wb):
+        if not r.get("Full Name") and not r.get("Intervention"):
+            continue
+        yield {
+            "source": source_tag,  # "carta" | "institutional"
+            "intervention": normalize_intervention(r.get("Intervention")),
+            "type": normalize_training_type(r.get("Type of training")),
+            "duty": normalize_duty(r.get("Principal duty at event (Participant/Facilitator)")),
+            "sex": normalize_gender(r.get("Sex")),
+            "year": to_year(r.get("Year")) or to_year(r.get("Event Start Date")),
+            "institution": (r.get("Associated institution") or "").strip() or None,
+            "is_carta_fellow": (str(r.get("CARTA Fellow (Yes/No)") or "").strip().lower().startswith("y")),
+        }
 
-    def _load(sheet_name, source_tag):
-        rows = read_sheet(src, sheet_name)
-        out = []
-        for r in rows:
-            if not r.get("Full Name") and not r.get("Intervention"):
-                continue
-            out.append({
-                "source": source_tag,  # "carta" | "institutional"
-                "intervention": normalize_intervention(r.get("Intervention")),
-                "type": normalize_training_type(r.get("Type of training")),
-                "duty": normalize_duty(r.get("Principal duty at event (Participant/Facilitator)")),
-                "sex": normalize_gender(r.get("Sex")),
-                "year": to_year(r.get("Year")) or to_year(r.get("Event Start Date")),
-                "institution": (r.get("Associated institution") or "").strip() or None,
-                "is_carta_fellow": (str(r.get("CARTA Fellow (Yes/No)") or "").strip().lower().startswith("y")),
-            })
-        return out
 
-    return _load("CARTA Organized", "carta") + _load("Local and Institutional ToTs", "institutional")
+def iter_trainings(checked: dict | None = None) -> Iterator[dict]:
+    import openpyxl
+
+    src = DATA_DIR / SOURCE_FILES["institutionalization"]
+    # Both sheets come from one workbook; load it once for the pair.
+    wb = openpyxl.load_workbook(src, read_only=True, data_only=True)
+    try:
+        yield from _iter_training_sheet(src, "CARTA Organized", "carta", checked, wb)
+        yield from _iter_training_sheet(src, "Local and Institutional ToTs", "institutional", checked, wb)
+    finally:
+        wb.close()
+
+
+def load_trainings(checked: dict | None = None):
+    return list(iter_trainings(checked))
+
+
+def count_curricula_training(counts: Counter, t: dict):
+    """Tally one training row towards load_curricula_institutions' threshold."""
+    if t["source"] == "institutional" and t["institution"]:
+        counts[t["institution"]] += 1
+
+
+def curricula_institutions(counts: Counter) -> list[str]:
+    # Threshold: at least 5 training-events at that institution to count as "adopted"
+    return sorted(name for name, n in counts.items() if n >= 5)
 
 
 def load_curricula_institutions(trainings: list[dict]) -> list[str]:
     """Derive list of institutions that have adopted CARTA curricula from institutional trainings."""
-    from collections import Counter
     counts = Counter()
     for t in trainings:
-        if t["source"] == "institutional" and t["institution"]:
-            counts[t["institution"]] += 1
-    # Threshold: at least 5 training-events at that institution to count as "adopted"
-    return sorted(name for name, n in counts.items() if n >= 5)
+        count_curricula_training(counts, t)
+    return curricula_institutions(counts)
 
 
 # ---------------------------------------------------------------------------
@@ -281,52 +439,92 @@ def load_curricula_institutions(trainings: list[dict]) -> list[str]:
 # ---------------------------------------------------------------------------
 
 
-def quick_measures(fellows, postdocs, grants, trainings) -> dict:
-    total_fellows = len(fellows)
-    by_status = {}
-    for f in fellows:
-        by_status[f["status"] or "Unknown"] = by_status.get(f["status"] or "Unknown", 0) + 1
-    by_gender = {}
-    for f in fellows:
-        by_gender[f["gender"] or "Unknown"] = by_gender.get(f["gender"] or "Unknown", 0) + 1
-    ttcs = [f["ttc_months"] for f in fellows if f["ttc_months"]]
-    avg_ttc = round(sum(ttcs) / len(ttcs), 1) if ttcs else None
-    median_ttc = None
-    if ttcs:
-        s = sorted(ttcs)
-        median_ttc = round(s[len(s) // 2] if len(s) % 2 else (s[len(s)//2 - 1] + s[len(s)//2]) / 2, 1)
-    total_grants = round(sum(g["amount_usd"] for g in grants))
-    pubs = sum((f["pubs_during_phd"] or 0) + (f["pubs_after_phd"] or 0) for f in fellows)
-    completed_fellows = by_status.get("Completed", 0)
-    retention_rate = round(((total_fellows - by_status.get("Terminated", 0)) / total_fellows) * 100, 1) if total_fellows else None
-
-    # Training counts (by intervention × type × source)
-    from collections import defaultdict
-    training_counts = defaultdict(int)
-    for t in trainings:
+class MeasuresAccumulator:
+    """Online form of quick_measures: feed rows one at a time, then call result().
+
+    Holds only counters plus the list of time-to-completion values needed for
+    the median, so the streaming build never keeps the rows themselves.
+    """
+
+    def __init__(self):
+        self.total_fellows = 0
+        self.by_status = {}
+        self.by_gender = {}
+        self.ttcs = []
+        self.pubs = 0
+        self.jas_person_events = 0
+        self.total_postdocs = 0
+        self.postdocs_completed = 0
+        self.grants_usd = 0
+        self.grants_count = 0
+        # Training counts (by intervention × type × source)
+        self.training_counts = defaultdict(int)
+
+    def add_fellow(self, f: dict):
+        self.total_fellows += 1
+        self.by_status[f["status"] or "Unknown"] = self.by_status.get(f["status"] or "Unknown", 0) + 1
+        self.by_gender[f["gender"] or "Unknown"] = self.by_gender.get(f["gender"] or "Unknown", 0) + 1
+        if f["ttc_months"]:
+            self.ttcs.append(f["ttc_months"])
+        self.pubs += (f["pubs_during_phd"] or 0) + (f["pubs_after_phd"] or 0)
+        self.jas_person_events += f.get("jas_attended", 0) or 0
+
+    def add_postdoc(self, p: dict):
+        self.total_postdocs += 1
+        if p["status"] == "Completed":
+            self.postdocs_completed += 1
+
+    def add_grant(self, g: dict):
+        self.grants_count += 1
+        self.grants_usd += g["amount_usd"]
+
+    def add_training(self, t: dict):
         if not t["intervention"] or not t["type"]:
-            continue
+            return
         key = f"{t['source']}::{t['intervention']}::{t['type']}"
-        training_counts[key] += 1
-    jas_person_events = sum(f.get("jas_attended", 0) or 0 for f in fellows)
+        self.training_counts[key] += 1
+
+    def result(self) -> dict:
+        total_fellows = self.total_fellows
+        by_status = self.by_status
+        ttcs = self.ttcs
+        avg_ttc = round(sum(ttcs) / len(ttcs), 1) if ttcs else None
+        median_ttc = None
+        if ttcs:
+            s = sorted(ttcs)
+            median_ttc = round(s[len(s) // 2] if len(s) % 2 else (s[len(s)//2 - 1] + s[len(s)//2]) / 2, 1)
+        retention_rate = round(((total_fellows - by_status.get("Terminated", 0)) / total_fellows) * 100, 1) if total_fellows else None
+
+        return {
+            "total_fellows": total_fellows,
+            "completed": by_status.get("Completed", 0),
+            "in_progress": by_status.get("In progress", 0),
+            "terminated": by_status.get("Terminated", 0),
+            "fellows_by_gender": self.by_gender,
+            "avg_ttc_months": avg_ttc,
+            "median_ttc_months": median_ttc,
+            "retention_rate_pct": retention_rate,
+            "total_postdocs": self.total_postdocs,
+            "postdocs_completed": self.postdocs_completed,
+            "extra_grants_usd": round(self.grants_usd),
+            "extra_grants_count": self.grants_count,
+            "peer_reviewed_articles": self.pubs,
+            "jas_person_events": self.jas_person_events,
+            "training_counts": dict(self.training_counts),
+        }
 
-    return {
-        "total_fellows": total_fellows,
-        "completed": completed_fellows,
-        "in_progress": by_status.get("In progress", 0),
-        "terminated": by_status.get("Terminated", 0),
-        "fellows_by_gender": by_gender,
-        "avg_ttc_months": avg_ttc,
-        "median_ttc_months": median_ttc,
-        "retention_rate_pct": retention_rate,
-        "total_postdocs": len(postdocs),
-        "postdocs_completed": sum(1 for p in postdocs if p["status"] == "Completed"),
-        "extra_grants_usd": total_grants,
-        "extra_grants_count": len(grants),
-        "peer_reviewed_articles": pubs,
-        "jas_person_events": jas_person_events,
-        "training_counts": dict(training_counts),
-    }
+
+def quick_measures(fellows, postdocs, grants, trainings) -> dict:
+    acc = MeasuresAccumulator()
+    for f in fellows:
+        acc.add_fellow(f)
+    for p in postdocs:
+        acc.add_postdoc(p)
+    for g in grants:
+        acc.add_grant(g)
+    for t in trainings:
+        acc.add_training(t)
+    return acc.result()
 
 
 # ---------------------------------------------------------------------------
@@ -334,31 +532,34 @@ def quick_measures(fellows, postdocs, grants, trainings) -> dict:
 # ---------------------------------------------------------------------------
 
 
-def main():
+def build_payload() -> dict:
+    """Run every extractor and assemble the stats_latest.json payload."""
     print("Building stats_latest.json...")
-    fellows = load_fellows()
+    checked = validate_sources()
+    with span("extract", source="fellows"):
+        fellows = load_fellows(checked)
     print(f"  Fellows: {len(fellows)}")
-    postdocs = load_postdocs()
+    with span("extract", source="postdocs"):
+        postdocs = load_postdocs(checked)
     print(f"  Postdocs: {len(postdocs)}")
-    grants = load_grants()
+    with span("extract", source="grants"):
+        grants = load_grants(checked)
     print(f"  Grants (with amounts): {len(grants)}")
-    trainings = load_trainings()
+    with span("extract", source="trainings"):
+        trainings = load_trainings(checked)
     print(f"  Training records: {len(trainings)}")
-    institutions = load_curricula_institutions(trainings)
+    with span("extract", source="curricula_institutions"):
+        institutions = load_curricula_institutions(trainings)
     print(f"  Curricula institutions: {len(institutions)}")
 
-    measures = quick_measures(fellows, postdocs, grants, trainings)
+    with span("quick_measures"):
+        measures = quick_measures(fellows, postdocs, grants, trainings)
     print(f"  Quick measures: total_fellows={measures['total_fellows']}, "
           f"completed={measures['completed']}, grants=${measures['extra_grants_usd']:,}")
 
-    payload = {
+    return {
         "generated_at": dt.datetime.now(dt.UTC).isoformat(timespec="seconds"),
-        "source_files": {
-            "fellows": "Cohort_1_11_Demographics_latest.xlsx",
-            "postdocs": "Postdocs_latest.xlsx",
-            "grants": "Extra Grants_latest.xlsx",
-            "institutionalization": "Institutionalization_latest.xlsx",
-        },
+        "source_files": dict(SOURCE_FILES),
         "rows": {
             "fellows": fellows,
             "postdocs": postdocs,
@@ -370,9 +571,171 @@ def main():
         "meta": {"summary": measures},
     }
 
-    OUT_FILE.write_text(json.dumps(payload, ensure_ascii=False, default=str), encoding="utf-8")
+
+def _dumps(v) -> str:
+    return json.dumps(v, ensure_ascii=False, default=str)
+
+
+def write_index(payload_head: dict, shards: dict, shard_dir: Path = SHARD_DIR):
+    """Write index.json: every non-row field of the payload plus the shard table."""
+    index = {k: v for k, v in payload_head.items() if k != "rows"}
+    index["shards"] = shards
+    (shard_dir / INDEX_FILE.name).write_text(_dumps(index), encoding="utf-8")
+    print(f"Wrote {shard_dir / INDEX_FILE.name} ({len(shards)} shards)")
+
+
+def write_shards(payload: dict, shard_dir: Path = SHARD_DIR):
+    """Write one JSON array per dataset in payload['rows'], then the index."""
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shards = {}
+    with span("json.shards") as s:
+        for key, rows in payload["rows"].items():
+            data = _dumps(rows).encode("utf-8")
+            (shard_dir / f"{key}.json").write_bytes(data)
+            shards[key] = {"file": f"{key}.json", "rows": len(rows), "bytes": len(data),
+                           "sha256": hashlib.sha256(data).hexdigest()}
+        s["shards"] = len(shards)
+    write_index(payload, shards, shard_dir)
+
+
+def write_payload(payload: dict):
+    with span("json.serialize") as s:
+        text = json.dumps(payload, ensure_ascii=False, default=str)
+        s["chars"] = len(text)
+    with span("json.write"):
+        OUT_FILE.write_text(text, encoding="utf-8")
     size_kb = OUT_FILE.stat().st_size / 1024
     print(f"Wrote {OUT_FILE} ({size_kb:.1f} KB)")
+    write_shards(payload)
+
+
+# ---------------------------------------------------------------------------
+# Streaming mode
+# ---------------------------------------------------------------------------
+
+
+class _HashingWriter:
+    """Writes text chunks to a file while hashing them.
+
+    For the combined file, `prefix=b"{"` and unhashed generated_at make the
+    hash match sha256(json.dumps(payload minus generated_at)) from the
+    in-memory path, so pipeline.py skips unchanged artifacts in either mode.
+    For shards (no prefix) it is simply the sha256 of the file, and `size`
+    its byte length.
+    """
+
+    def __init__(self, f, prefix: bytes = b""):
+        self.f = f
+        self.h = hashlib.sha256(prefix)
+        self.size = 0
+
+    def write(self, chunk: str, hashed: bool = True):
+        self.f.write(chunk)
+        data = chunk.encode("utf-8")
+        self.size += len(data)
+        if hashed:
+            self.h.update(data)
+
+
+def _write_array(writers, rows, on_row=None) -> int:
+    """Encode an iterable as a JSON array one element at a time into every
+    writer; returns the count."""
+    def emit(chunk):
+        for w in writers:
+            w.write(chunk)
+
+    n = 0
+    emit("[")
+    for row in rows:
+        if on_row:
+            on_row(row)
+        emit(", " + _dumps(row) if n else _dumps(row))
+        n += 1
+    emit("]")
+    return n
+
+
+def _write_section(w: _HashingWriter, shard_dir: Path, key: str, rows, on_row=None) -> dict:
+    """Stream one dataset into the combined file and its own shard; returns its index entry."""
+    tmp_file = shard_dir / f"{key}.json.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        shard = _HashingWriter(f)
+        n = _write_array([w, shard], rows, on_row)
+    return {"file": f"{key}.json", "rows": n, "bytes": shard.size, "sha256": shard.h.hexdigest()}
+
+
+def stream_build(out_file: Path = OUT_FILE, shard_dir: Path = SHARD_DIR) -> tuple[dict, str]:
+    """Build stats_latest.json and its shards in a single streaming pass.
+
+    Rows flow from openpyxl through the extractors straight into the JSON
+    encoder; quick measures and curricula counts are accumulated on the way,
+    so memory stays flat however large the workbooks grow. The output is
+    byte-identical to write_payload(build_payload()) apart from generated_at.
+    Everything is written to temp files that replace the targets only once
+    complete.
+
+    Returns (measures, digest of the payload without generated_at).
+    """
+    print(f"Building {out_file.name} (streaming)...")
+    checked = validate_sources()
+    acc = MeasuresAccumulator()
+    curricula_counts = Counter()
+
+    def on_training(t):
+        acc.add_training(t)
+        count_curricula_training(curricula_counts, t)
+
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shards = {}
+    tmp_file = out_file.with_name(out_file.name + ".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        w = _HashingWriter(f, prefix=b"{")
+        generated_at = dt.datetime.now(dt.UTC).isoformat(timespec="seconds")
+        w.write(f'{{"generated_at": {_dumps(generated_at)}, ', hashed=False)
+        w.write(f'"source_files": {_dumps(dict(SOURCE_FILES))}, "rows": {{')
+
+        sections = [
+            ("fellows", "Fellows", iter_fellows, acc.add_fellow),
+            ("postdocs", "Postdocs", iter_postdocs, acc.add_postdoc),
+            ("grants", "Grants (with amounts)", iter_grants, acc.add_grant),
+            ("trainings", "Training records", iter_trainings, on_training),
+        ]
+        for key, label, rows, on_row in sections:
+            with span("extract", source=key, stream=True) as s:
+                w.write(f'{_dumps(key)}: ')
+                shards[key] = _write_section(w, shard_dir, key, rows(checked), on_row)
+                s["rows"] = shards[key]["rows"]
+                w.write(", ")
+            print(f"  {label}: {s['rows']}")
+
+        institutions = curricula_institutions(curricula_counts)
+        w.write('"curricula_institutions": ')
+        shards["curricula_institutions"] = _write_section(
+            w, shard_dir, "curricula_institutions", ({"name": n} for n in institutions))
+        print(f"  Curricula institutions: {len(institutions)}")
+
+        measures = acc.result()
+        w.write(f'}}, "measures_static": {{}}, "meta": {{"summary": {_dumps(measures)}}}}}')
+    os.replace(tmp_file, out_file)
+    for key in shards:
+        os.replace(shard_dir / f"{key}.json.tmp", shard_dir / f"{key}.json")
+    write_index({"generated_at": generated_at, "source_files": dict(SOURCE_FILES),
+                 "measures_static": {}, "meta": {"summary": measures}}, shards, shard_dir)
+
+    print(f"  Quick measures: total_fellows={measures['total_fellows']}, "
+          f"completed={measures['completed']}, grants=${measures['extra_grants_usd']:,}")
+    size_kb = out_file.stat().st_size / 1024
+    print(f"Wrote {out_file} ({size_kb:.1f} KB)")
+    return measures, w.h.hexdigest()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--stream" in argv:
+        stream_build()
+    else:
+        write_payload(build_payload())
+    print(f"Metrics: {emit_metrics('build')}")
     return 0
 
 
@@ -2,14 +2,18 @@ import requests
 import os
 import json
 import glob
+import time
 from datetime import datetime
 
-def get_access_token_delegated():
-    """Get access token using refresh token (delegated permissions) with improved error handling"""
+from metrics import emit as emit_metrics, incr, span
+from retention import DEFAULT_POLICY as RETENTION_POLICY, apply_retention, version_sort_key
+from token_manager import TokenManager
+
+def _request_token_delegated(refresh_token):
+    """Exchange a refresh token for a new token response (delegated permissions) with improved error handling"""
     tenant_id = os.environ['TENANT_ID'].strip()
     client_id = os.environ['CLIENT_ID'].strip()
     client_secret = os.environ['CLIENT_SECRET'].strip()
-    refresh_token = os.environ['REFRESH_TOKEN'].strip()
 
     url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
 
@@ -27,7 +31,9 @@ def get_access_token_delegated():
     print(f"[*] Refresh token length: {len(refresh_token)} chars")
 
     try:
-        response = requests.post(url, data=data, timeout=30)
+        with span("auth.token") as s:
+            response = requests.post(url, data=data, timeout=30)
+            s["status"] = response.status_code
 
         if response.status_code != 200:
             print(f"[X] Authentication failed: {response.status_code}")
@@ -41,21 +47,8 @@ def get_access_token_delegated():
             response.raise_for_status()
 
         token_data = response.json()
-
-        if 'refresh_token' in token_data:
-            new_refresh = token_data['refresh_token']
-            print("[!] New refresh token issued!")
-            print(f"[!] UPDATE GitHub Secret REFRESH_TOKEN with:\n{new_refresh}\n")
-
-            with open('NEW_REFRESH_TOKEN.txt', 'w', encoding='utf-8') as f:
-                f.write(f"New refresh token issued: {datetime.now()}\n\n")
-                f.write(f"{new_refresh}\n\n")
-                f.write("ACTION REQUIRED:\n")
-                f.write("Update GitHub Secret 'REFRESH_TOKEN' with the value above\n")
-            print("[*] New token also saved to: NEW_REFRESH_TOKEN.txt")
-
-        print("[+] Access token obtained successfully")
-        return token_data['access_token']
+        print(f"[+] Access token obtained successfully (expires in {token_data.get('expires_in', '?')}s)")
+        return token_data
 
     except requests.exceptions.HTTPError as e:
         print(f"\n[X] HTTP Error: {e}")
@@ -64,11 +57,39 @@ def get_access_token_delegated():
         print(f"\n[X] Unexpected error: {e}")
         raise
 
+_token_manager = None
+
+def get_token_manager():
+    """Process-wide TokenManager for the delegated flow.
+
+    The access token is cached (in memory and in TOKEN_CACHE_FILE) and reused
+    for every file in the run; it is refreshed shortly before it expires and
+    rotated refresh tokens are persisted via CREDENTIAL_STORE.
+    """
+    global _token_manager
+    if _token_manager is None:
+        client_id = os.environ['CLIENT_ID'].strip()
+        _token_manager = TokenManager(
+            _request_token_delegated,
+            refresh_token=os.environ['REFRESH_TOKEN'].strip(),
+            cache_key=f"delegated:{client_id}",
+        )
+    return _token_manager
+
+def get_access_token_delegated():
+    """Get a valid access token using refresh token (delegated permissions)"""
+    return get_token_manager().get()
+
 # 📋 CONFIGURATION: File management settings
 FILE_MANAGEMENT = {
     'keep_versions': 2,
     'archive_old_files': True,
-    'create_changelog': True
+    'create_changelog': True,
+    # Age tiers for thinning data/archive (see retention.py); None keeps every version.
+    'retention': RETENTION_POLICY,
+    # Delete archived versions the retention policy drops after each new version.
+    # Off by default: review `python retention.py` (dry run) before enabling.
+    'thin_archive': False,
 }
 
 FILES_TO_DOWNLOAD = [
@@ -104,14 +125,43 @@ FILES_TO_DOWNLOAD = [
     }
 ]
 
-def _try_download(file_id, headers, **kwargs):
-    """Wrapper that returns None on failure instead of raising, so one bad
-    match doesn't prevent fallback strategies from running."""
-    try:
-        return download_file_by_id(file_id, headers, **kwargs)
-    except Exception as e:
-        print(f"    [!] Download attempt failed, will try next strategy: {e}")
-        return None
+# Transient failures (timeouts, connection resets, 429/5xx) are retried this many
+# times per search hit, with exponential backoff starting at DOWNLOAD_BACKOFF_SECONDS.
+DOWNLOAD_RETRIES = 2
+DOWNLOAD_BACKOFF_SECONDS = 2
+
+def _is_transient(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 429 or (status is not None and status >= 500)
+
+def _try_download(file_id, headers, output_name, strategy, candidate_index, **kwargs):
+    """Download one search hit, retrying transient errors up to DOWNLOAD_RETRIES
+    times. Returns None on failure instead of raising, so one bad match doesn't
+    prevent fallback strategies from running."""
+    incr("download.attempts")
+    with span("download", file=output_name, strategy=strategy,
+              candidate_index=candidate_index) as s:
+        s["retries"] = 0
+        s["bytes"] = 0
+        while True:
+            try:
+                content = download_file_by_id(file_id, headers, **kwargs)
+                s["bytes"] = len(content) if content else 0
+                return content
+            except Exception as e:
+                if s["retries"] < DOWNLOAD_RETRIES and _is_transient(e):
+                    delay = DOWNLOAD_BACKOFF_SECONDS * 2 ** s["retries"]
+                    s["retries"] += 1
+                    incr("download.retries")
+                    print(f"    [!] Download failed ({e}), retrying in {delay}s")
+                    time.sleep(delay)
+                    continue
+                incr("download.failed_attempts")
+                s["error"] = repr(e)
+                print(f"    [!] Download attempt failed, will try next strategy: {e}")
+                return None
 
 def search_for_file(headers, search_config):
     """Search for a specific file using multiple strategies.
@@ -121,6 +171,8 @@ def search_for_file(headers, search_config):
     """
     search_terms = search_config['search_terms']
     filename_contains = search_config['filename_contains']
+    output_name = search_config['output_name']
+    candidates = 0
 
     print(f"[*] Searching for: {search_config['description']}")
 
@@ -129,7 +181,9 @@ def search_for_file(headers, search_config):
         search_url = f"https://graph.microsoft.com/v1.0/users/nnjenga@aphrc.org/drive/root/search(q='{term}')"
 
         try:
-            response = requests.get(search_url, headers=headers, timeout=30)
+            with span("search.user_drive", file=output_name, term=term) as s:
+                response = requests.get(search_url, headers=headers, timeout=30)
+                s["status"] = response.status_code
             if response.status_code == 200:
                 results = response.json()
                 for item in results.get('value', []):
@@ -137,7 +191,9 @@ def search_for_file(headers, search_config):
                     if (filename_contains.lower() in filename and
                         (filename.endswith('.xlsx') or filename.endswith('.xls'))):
                         print(f"    [+] Found: {item['name']}")
-                        content = _try_download(item['id'], headers, user_drive="nnjenga@aphrc.org")
+                        content = _try_download(item['id'], headers, output_name, "user_drive", candidates,
+                                                user_drive="nnjenga@aphrc.org")
+                        candidates += 1
                         if content:
                             return content
                         # else: fall through and keep looking
@@ -149,7 +205,9 @@ def search_for_file(headers, search_config):
         search_url = f"https://graph.microsoft.com/v1.0/sites/aphrcorg-my.sharepoint.com/drive/root/search(q='{term}')"
 
         try:
-            response = requests.get(search_url, headers=headers, timeout=30)
+            with span("search.sharepoint", file=output_name, term=term) as s:
+                response = requests.get(search_url, headers=headers, timeout=30)
+                s["status"] = response.status_code
             if response.status_code == 200:
                 results = response.json()
                 for item in results.get('value', []):
@@ -157,7 +215,9 @@ def search_for_file(headers, search_config):
                     if (filename_contains.lower() in filename and
                         (filename.endswith('.xlsx') or filename.endswith('.xls'))):
                         print(f"    [+] Found in SharePoint: {item['name']}")
-                        content = _try_download(item['id'], headers, site_drive=True)
+                        content = _try_download(item['id'], headers, output_name, "sharepoint", candidates,
+                                                site_drive=True)
+                        candidates += 1
                         if content:
                             return content
         except Exception as e:
@@ -193,7 +253,8 @@ def manage_file_versions(output_name):
     existing_files = [f for f in glob.glob(pattern)
                       if not f.endswith(f"{output_name}_latest.xlsx")]
 
-    existing_files.sort(key=os.path.getmtime, reverse=True)
+    # Order by the timestamp in the filename: mtimes are all equal after a git checkout.
+    existing_files.sort(key=version_sort_key, reverse=True)
 
     keep_count = FILE_MANAGEMENT['keep_versions']
 
@@ -204,7 +265,8 @@ def manage_file_versions(output_name):
             try:
                 if FILE_MANAGEMENT['archive_old_files']:
                     archive_path = os.path.join(archive_dir, os.path.basename(old_file))
-                    os.rename(old_file, archive_path)
+                    with span("archive.move", file=os.path.basename(old_file)):
+                        os.rename(old_file, archive_path)
                     print(f"    [*] Archived: {os.path.basename(old_file)}")
                 else:
                     os.remove(old_file)
@@ -212,6 +274,17 @@ def manage_file_versions(output_name):
             except Exception as e:
                 print(f"    [!] Could not move/delete {old_file}: {e}")
 
+    if FILE_MANAGEMENT['archive_old_files'] and FILE_MANAGEMENT['retention'] and FILE_MANAGEMENT['thin_archive']:
+        policy = {**FILE_MANAGEMENT['retention'], 'min_keep': keep_count}
+        with span("archive.thin", file=output_name) as s:
+            result = apply_retention(output_name, policy, dry_run=False, dirs=(data_dir, archive_dir))
+            s["files"] = result["files"]
+            s["bytes"] = result["bytes"]
+        for path, reason in result["drops"]:
+            print(f"    [*] Thinned: {os.path.basename(path)} [{reason}]")
+        if result["files"]:
+            print(f"    [*] Reclaimed {result['bytes']:,} bytes from archive")
+
 def check_if_file_changed(new_content, output_name):
     """Check if the new file is different from the current latest version"""
     latest_file = f"data/{output_name}_latest.xlsx"
@@ -235,6 +308,7 @@ def save_file_with_version_control(file_content, output_name, description):
 
     if not check_if_file_changed(file_content, output_name):
         print(f"    [*] No changes detected for: {description}")
+        incr("files.unchanged")
         return True
 
     print(f"    [+] Changes detected - updating: {description}")
@@ -246,12 +320,14 @@ def save_file_with_version_control(file_content, output_name, description):
     manage_file_versions(output_name)
 
     timestamped_filename = f"data/{output_name}_{timestamp}.xlsx"
-    with open(timestamped_filename, 'wb') as f:
-        f.write(file_content)
-
     latest_filename = f"data/{output_name}_latest.xlsx"
-    with open(latest_filename, 'wb') as f:
-        f.write(file_content)
+    with span("save", file=output_name, bytes=len(file_content)):
+        with open(timestamped_filename, 'wb') as f:
+            f.write(file_content)
+
+        with open(latest_filename, 'wb') as f:
+            f.write(file_content)
+    incr("files.updated")
 
     print(f"    [+] Saved {len(file_content):,} bytes")
     print(f"    [*] Current: {latest_filename}")
@@ -286,68 +362,69 @@ def update_changelog(output_name, description, timestamp):
     with open(changelog_file, 'w', encoding='utf-8') as f:
         f.write(changelog_content)
 
-def download_all_files():
-    """Download all configured files with version control.
+def fetch_all_files(token_manager):
+    """Download every configured file into memory.
 
-    Each file is processed independently — a failure on one file NEVER prevents
-    the others from being downloaded and saved.
+    Returns {output_name: content or None}. Each file is fully isolated — any
+    exception is caught so we always continue to the next file.
     """
-    print("\n" + "=" * 70)
-    print("CARTA DASHBOARD - FILE DOWNLOAD")
-    print("=" * 70)
+    results = {}
 
-    access_token = get_access_token_delegated()
+    for i, file_config in enumerate(FILES_TO_DOWNLOAD, 1):
+        print(f"\n[{i}/{len(FILES_TO_DOWNLOAD)}] {file_config['description']}")
+        print("-" * 40)
 
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Accept': 'application/json'
-    }
+        try:
+            # Re-read per file so a long run refreshes before the token expires.
+            headers = token_manager.headers(Accept='application/json')
+            results[file_config['output_name']] = search_for_file(headers, file_config)
+        except Exception as e:
+            print(f"    [X] Unexpected error on {file_config['description']}: {e}")
+            import traceback
+            traceback.print_exc()
+            results[file_config['output_name']] = None
+            # Critical: do NOT re-raise — keep going so the rest still get saved.
+
+    return results
 
+def save_all_files(results):
+    """Save downloaded contents with version control.
+
+    Returns (successful, failed, failed_descriptions). A failure saving one
+    file never prevents the others from being saved.
+    """
     successful_downloads = 0
     failed_downloads = 0
     failed_files = []
 
-    print(f"\n[*] Starting multi-file download with version control...")
-    print(f"[*] Keeping {FILE_MANAGEMENT['keep_versions']} versions per file")
-    print("=" * 70)
-
-    for i, file_config in enumerate(FILES_TO_DOWNLOAD, 1):
-        print(f"\n[{i}/{len(FILES_TO_DOWNLOAD)}] {file_config['description']}")
-        print("-" * 40)
+    for file_config in FILES_TO_DOWNLOAD:
+        file_content = results.get(file_config['output_name'])
 
-        # Each file is fully isolated. Any exception here is caught so we always
-        # continue to the next file — successes are saved regardless of failures.
-        try:
-            file_content = search_for_file(headers, file_config)
-
-            if file_content:
-                try:
-                    if save_file_with_version_control(
-                        file_content,
-                        file_config['output_name'],
-                        file_config['description']
-                    ):
-                        successful_downloads += 1
-                    else:
-                        failed_downloads += 1
-                        failed_files.append(file_config['description'])
-                except Exception as e:
-                    print(f"    [X] Error saving {file_config['description']}: {e}")
+        if file_content:
+            try:
+                if save_file_with_version_control(
+                    file_content,
+                    file_config['output_name'],
+                    file_config['description']
+                ):
+                    successful_downloads += 1
+                else:
                     failed_downloads += 1
                     failed_files.append(file_config['description'])
-            else:
-                print(f"    [X] Could not download: {file_config['description']}")
+            except Exception as e:
+                print(f"    [X] Error saving {file_config['description']}: {e}")
                 failed_downloads += 1
                 failed_files.append(file_config['description'])
-
-        except Exception as e:
-            print(f"    [X] Unexpected error on {file_config['description']}: {e}")
-            import traceback
-            traceback.print_exc()
+        else:
+            print(f"    [X] Could not download: {file_config['description']}")
             failed_downloads += 1
             failed_files.append(file_config['description'])
-            # Critical: do NOT re-raise — keep going so the rest still get saved.
 
+    incr("files.ok", successful_downloads)
+    incr("files.failed", failed_downloads)
+    return successful_downloads, failed_downloads, failed_files
+
+def print_download_summary(successful_downloads, failed_downloads, failed_files):
     print("\n" + "=" * 70)
     print("DOWNLOAD SUMMARY")
     print("=" * 70)
@@ -366,6 +443,28 @@ def download_all_files():
     if FILE_MANAGEMENT['create_changelog']:
         print(f"    - Change history: data/CHANGELOG.md")
 
+def download_all_files():
+    """Download all configured files with version control.
+
+    Each file is processed independently — a failure on one file NEVER prevents
+    the others from being downloaded and saved.
+    """
+    print("\n" + "=" * 70)
+    print("CARTA DASHBOARD - FILE DOWNLOAD")
+    print("=" * 70)
+
+    # Fail fast on auth errors before touching any file.
+    token_manager = get_token_manager()
+    token_manager.get()
+
+    print(f"\n[*] Starting multi-file download with version control...")
+    print(f"[*] Keeping {FILE_MANAGEMENT['keep_versions']} versions per file")
+    print("=" * 70)
+
+    results = fetch_all_files(token_manager)
+    successful_downloads, failed_downloads, failed_files = save_all_files(results)
+    print_download_summary(successful_downloads, failed_downloads, failed_files)
+
     return successful_downloads, failed_downloads
 
 def main():
@@ -377,8 +476,11 @@ def main():
         print(f"\n[X] Critical error (auth/setup): {e}")
         import traceback
         traceback.print_exc()
+        emit_metrics("download")
         exit(1)
 
+    emit_metrics("download")
+
     # Key change: as long as AT LEAST ONE file was saved, exit successfully so
     # that downstream steps (e.g. git commit/push in CI) still run and the
     # successful downloads are not held hostage by the failed ones.
@@ -1,10 +1,14 @@
 import requests
 import os
 from datetime import datetime
-import msal
 
-def get_access_token():
-    """Get access token for Microsoft Graph API"""
+from token_manager import CredentialStore, TokenManager
+
+def _request_token_app(_refresh_token=None):
+    """Request an app-only token response for Microsoft Graph API"""
+    # Imported here so the cached-token path never pays msal's import cost.
+    import msal
+
     tenant_id = os.environ['TENANT_ID']
     client_id = os.environ['CLIENT_ID']
     client_secret = os.environ['CLIENT_SECRET']
@@ -20,10 +24,24 @@ def get_access_token():
     result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
     
     if "access_token" in result:
-        return result["access_token"]
+        return result
     else:
         raise Exception(f"Failed to get access token: {result.get('error_description', 'Unknown error')}")
 
+_token_manager = None
+
+def get_access_token():
+    """Get access token for Microsoft Graph API, reusing the cached one until near expiry"""
+    global _token_manager
+    if _token_manager is None:
+        # Client-credentials flow: no refresh token to rotate or persist.
+        _token_manager = TokenManager(
+            _request_token_app,
+            cache_key=f"app:{os.environ['CLIENT_ID'].strip()}",
+            store=CredentialStore("none"),
+        )
+    return _token_manager.get()
+
 def download_file():
     """Download the Excel file from SharePoint"""
     source_url = os.environ['SOURCE_URL']
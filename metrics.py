@@ -0,0 +1,151 @@
+"""Lightweight timing and counter instrumentation for the pipeline scripts.
+
+Both `download_delegated.py` and `build_stats.py` record into the process-wide
+recorder through `span()` and `incr()`, then call `emit()` once at the end of
+the run. `emit()` writes:
+
+- `<dir>/metrics_<stage>_latest.json`: every span (name, offset, duration,
+  attributes), a per-name summary (count / total / max ms), and counters.
+  `<dir>` is data/ by default; pipeline.py uses the uncommitted metrics/.
+- `data/metrics_history.jsonl`: one summary line per run, appended and
+  committed with the data, so run-time trends can be tracked over months
+  without keeping every full report. pipeline.py only appends on runs that
+  commit, so no-change days stay commit-free.
+- `<dir>/trace_<stage>_latest.json` (only when METRICS_TRACE=1): the same
+  spans in Chrome trace-event format, viewable in chrome://tracing or Perfetto.
+
+Usage:
+    with span("download", file="Postdocs") as s:
+        content = fetch()
+        s["bytes"] = len(content)
+    incr("downloads.ok")
+"""
+import datetime as dt
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+HISTORY_FILE = DATA_DIR / "metrics_history.jsonl"
+
+
+class Recorder:
+    """Collects finished spans and counters for a single run."""
+
+    def __init__(self):
+        self.started_at = dt.datetime.now(dt.UTC)
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: list[dict] = []
+        self.counters: dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time the enclosed block. Yields `attrs` so callers can add fields
+        (bytes, retries, rows, ...) once they are known. Spans that raise are
+        still recorded, with `error` set to the exception repr."""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = repr(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            record = {
+                "name": name,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "dur_ms": round((end - start) * 1000, 3),
+                "tid": threading.get_ident(),
+                "attrs": attrs,
+            }
+            with self._lock:
+                self.spans.append(record)
+
+    def incr(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        """Per-span-name count / total / max, in milliseconds."""
+        out = {}
+        for s in self.spans:
+            agg = out.setdefault(s["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            agg["count"] += 1
+            agg["total_ms"] = round(agg["total_ms"] + s["dur_ms"], 3)
+            agg["max_ms"] = max(agg["max_ms"], s["dur_ms"])
+        return out
+
+    def report(self, stage: str) -> dict:
+        return {
+            "stage": stage,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "summary": self.summary(),
+            "counters": dict(self.counters),
+            "spans": list(self.spans),
+        }
+
+    def chrome_trace(self) -> dict:
+        """Spans as Chrome trace-event 'complete' events (timestamps in µs)."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": round(s["start_ms"] * 1000),
+                "dur": round(s["dur_ms"] * 1000),
+                "pid": pid,
+                "tid": s["tid"],
+                "args": s["attrs"],
+            }
+            for s in self.spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+RUN = Recorder()
+
+
+def span(name: str, **attrs):
+    return RUN.span(name, **attrs)
+
+
+def incr(name: str, n: float = 1):
+    RUN.incr(name, n)
+
+
+def append_history(line: dict, history_file: Path = HISTORY_FILE):
+    """Append one JSON line to the run history."""
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+
+
+def emit(stage: str, data_dir: Path = DATA_DIR, history_file: Path | None = HISTORY_FILE) -> Path:
+    """Write the per-run metrics report (and optional trace) for `stage` to
+    `data_dir`, and append its summary line to `history_file` unless None.
+
+    Never raises: instrumentation must not fail a run that otherwise succeeded.
+    """
+    out_file = data_dir / f"metrics_{stage}_latest.json"
+    try:
+        data_dir.mkdir(parents=True, exist_ok=True)
+        report = RUN.report(stage)
+        out_file.write_text(json.dumps(report, ensure_ascii=False, default=str, indent=1), encoding="utf-8")
+
+        if history_file is not None:
+            history_line = {k: report[k] for k in ("stage", "started_at", "wall_ms", "counters")}
+            history_line["summary"] = {k: v["total_ms"] for k, v in report["summary"].items()}
+            append_history(history_line, history_file)
+
+        if os.environ.get("METRICS_TRACE", "").strip() not in ("", "0"):
+            trace_file = data_dir / f"trace_{stage}_latest.json"
+            trace_file.write_text(json.dumps(RUN.chrome_trace(), default=str), encoding="utf-8")
+            print(f"[*] Chrome trace written: {trace_file}")
+    except Exception as e:
+        print(f"[!] Could not write metrics for {stage}: {e}")
+    return out_file
@@ -0,0 +1,312 @@
+"""Single-process entry point for the daily dashboard refresh.
+
+Runs the pipeline as a small DAG of stages in one interpreter:
+
+    download  ->  version  ->  build  ->  artifacts
+                          \->  archive_index
+
+Each stage declares an `inputs` callable returning {name: sha256} and the
+`outputs` it writes. Digests of the last successful run are kept in
+`data/.pipeline_state.json` (committed with the data, so CI sees them after a
+fresh checkout); a stage is skipped when its input digests are unchanged and
+its outputs still exist. The state file is written once, after every stage
+has succeeded, so a failure in a later stage makes the next run redo the
+earlier ones too. On a no-change day only `download` does any work, nothing
+under data/ is rewritten, and `changed=false` is reported to $GITHUB_OUTPUT so
+the workflow skips the commit.
+
+The full metrics report is written to metrics/ on every run, including
+no-change days. That directory is not committed; the workflow uploads it as an
+artifact. Runs that commit also append their summary line to the committed
+data/metrics_history.jsonl.
+
+Run locally:  python pipeline.py                  # full run
+              python pipeline.py --skip-download  # rebuild from data/ only
+              python pipeline.py --force          # ignore recorded digests
+              python pipeline.py --dry-run        # show which stages are stale
+              python pipeline.py --stream         # memory-bounded build (build_stats.stream_build)
+
+Heavy dependencies (requests, openpyxl) are imported inside the stages that
+use them, so a dry run or a fully skipped stage never pays for them; see
+bench_startup.py for the cold-start numbers.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from metrics import HISTORY_FILE, emit as emit_metrics, incr, span
+
+ROOT_DIR = Path(__file__).resolve().parent
+DATA_DIR = ROOT_DIR / "data"
+STATE_FILE = DATA_DIR / ".pipeline_state.json"
+METRICS_DIR = ROOT_DIR / "metrics"
+# Streaming builds write here; the artifacts stage moves the files into place.
+STAGED_DIR = DATA_DIR / ".staged"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digests(paths) -> dict:
+    """{filename: sha256} for each path; missing files map to None."""
+    out = {}
+    for p in paths:
+        p = Path(p)
+        out[p.name] = sha256_bytes(p.read_bytes()) if p.exists() else None
+    return out
+
+
+class Stage:
+    """One node of the pipeline DAG.
+
+    `run(ctx)` does the work and may put results in the shared `ctx` dict. It
+    may return the input names it failed to process; their digests are not
+    recorded, so the next run retries them.
+    `inputs(ctx)` returns the digests that decide whether the stage is stale,
+    or None when an upstream stage produced nothing for it (the stage is then
+    skipped). A stage without `inputs` always runs (e.g. the network
+    download). `outputs` are paths that must exist for a skip to be valid.
+    """
+
+    def __init__(self, name, run, inputs=None, outputs=(), after=()):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.after = tuple(after)
+
+
+def topo_order(stages: list[Stage]) -> list[Stage]:
+    by_name = {s.name: s for s in stages}
+    ordered, seen = [], set()
+
+    def visit(stage, path=()):
+        if stage.name in seen:
+            return
+        if stage.name in path:
+            raise ValueError(f"Pipeline cycle: {' -> '.join(path + (stage.name,))}")
+        for dep in stage.after:
+            visit(by_name[dep], path + (stage.name,))
+        seen.add(stage.name)
+        ordered.append(stage)
+
+    for s in stages:
+        visit(s)
+    return ordered
+
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    STATE_FILE.write_text(json.dumps(state, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def run_pipeline(stages: list[Stage], ctx: dict, force: bool = False) -> list[str]:
+    """Run stale stages in dependency order. Returns the names of stages that ran.
+
+    Digests are saved only once all stages have succeeded.
+    """
+    state = load_state()
+    ran = []
+    for stage in topo_order(stages):
+        digests = stage.inputs(ctx) if stage.inputs else None
+        if stage.inputs and digests is None:
+            print(f"[*] Stage '{stage.name}': no upstream input - skipped")
+            incr(f"stage.{stage.name}.skipped")
+            continue
+        outputs_ok = all(Path(p).exists() for p in stage.outputs)
+        if not force and digests is not None and outputs_ok and state.get(stage.name) == digests:
+            print(f"[*] Stage '{stage.name}': inputs unchanged - skipped")
+            incr(f"stage.{stage.name}.skipped")
+            continue
+        print(f"\n[*] Stage '{stage.name}': running")
+        with span(f"stage.{stage.name}"):
+            failed = stage.run(ctx) or ()
+        ran.append(stage.name)
+        if digests is not None:
+            state[stage.name] = {k: None if k in failed else v for k, v in digests.items()}
+    if state != load_state():
+        save_state(state)
+    return ran
+
+
+def plan(stages: list[Stage], ctx: dict) -> list[tuple[str, str]]:
+    """Dry run: report each stage's status without running anything."""
+    state = load_state()
+    out = []
+    for stage in topo_order(stages):
+        if not stage.inputs:
+            status = "always runs"
+        else:
+            digests = stage.inputs(ctx)
+            if digests is None:
+                status = "runs if upstream output changes"
+            elif state.get(stage.name) == digests and all(Path(p).exists() for p in stage.outputs):
+                status = "up to date"
+            else:
+                status = "stale"
+        out.append((stage.name, status))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+
+def _download(ctx):
+    import download_delegated as dd
+    token_manager = dd.get_token_manager()
+    token_manager.get()
+    ctx["downloads"] = dd.fetch_all_files(token_manager)
+
+
+def _version_inputs(ctx):
+    if "downloads" not in ctx:
+        return None
+    return {name: sha256_bytes(content) if content else None
+            for name, content in ctx["downloads"].items()}
+
+
+def _version(ctx):
+    import download_delegated as dd
+    successful, failed, failed_files = dd.save_all_files(ctx["downloads"])
+    dd.print_download_summary(successful, failed, failed_files)
+    return [f['output_name'] for f in dd.FILES_TO_DOWNLOAD if f['description'] in failed_files]
+
+
+def _build_inputs(ctx):
+    import build_stats
+    digests = file_digests(build_stats.DATA_DIR / f for f in build_stats.SOURCE_FILES.values())
+    digests.update(file_digests([ROOT_DIR / "build_stats.py", ROOT_DIR / "schemas.py"]))
+    return digests
+
+
+def _build(ctx):
+    import build_stats
+    ctx["payload"] = build_stats.build_payload()
+
+
+def _build_streaming(ctx):
+    import build_stats
+    STAGED_DIR.mkdir(exist_ok=True)
+    _, ctx["payload_digest"] = build_stats.stream_build(
+        STAGED_DIR / build_stats.OUT_FILE.name, STAGED_DIR / build_stats.SHARD_DIR.name)
+
+
+def _artifact_inputs(ctx):
+    if "payload_digest" in ctx:
+        return {"payload": ctx["payload_digest"]}
+    payload = ctx.get("payload")
+    if payload is None:
+        return None
+    # generated_at changes every build; the artifact is stale only if the data is.
+    body = {k: v for k, v in payload.items() if k != "generated_at"}
+    return {"payload": sha256_bytes(json.dumps(body, ensure_ascii=False, default=str).encode("utf-8"))}
+
+
+def _artifacts(ctx):
+    import build_stats
+    if "payload_digest" in ctx:
+        os.replace(STAGED_DIR / build_stats.OUT_FILE.name, build_stats.OUT_FILE)
+        build_stats.SHARD_DIR.mkdir(exist_ok=True)
+        for shard in (STAGED_DIR / build_stats.SHARD_DIR.name).iterdir():
+            os.replace(shard, build_stats.SHARD_DIR / shard.name)
+        print(f"Wrote {build_stats.OUT_FILE} and {build_stats.SHARD_DIR}/")
+    else:
+        build_stats.write_payload(ctx["payload"])
+
+
+def _archive_index_inputs(ctx):
+    from retention import ARCHIVE_DIR, parse_version
+    # Archived snapshots are immutable once written, so name + size identifies them.
+    return {p.name: p.stat().st_size for p in sorted(ARCHIVE_DIR.glob("*.xlsx")) if parse_version(p)}
+
+
+def _archive_index(ctx):
+    import archive_index
+    archive_index.update_index()
+
+
+def make_stages(skip_download: bool = False, stream: bool = False) -> list[Stage]:
+    import build_stats
+    stages = [
+        # build lists the published files too: if one goes missing the payload
+        # must be rebuilt, since the artifacts stage cannot write without it.
+        Stage("build", _build_streaming if stream else _build, inputs=_build_inputs,
+              outputs=[build_stats.OUT_FILE, build_stats.INDEX_FILE]),
+        Stage("artifacts", _artifacts, inputs=_artifact_inputs,
+              outputs=[build_stats.OUT_FILE, build_stats.INDEX_FILE], after=["build"]),
+        Stage("archive_index", _archive_index, inputs=_archive_index_inputs,
+              outputs=[DATA_DIR / "archive" / "index.json"]),
+    ]
+    if not skip_download:
+        stages[0].after = ("version",)
+        stages[2].after = ("version",)
+        stages = [
+            Stage("download", _download),
+            Stage("version", _version, inputs=_version_inputs, after=["download"]),
+        ] + stages
+    return stages
+
+
+def _report_changed(changed: bool):
+    gh_output = os.environ.get("GITHUB_OUTPUT")
+    if gh_output:
+        with open(gh_output, "a", encoding="utf-8") as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="run every stage regardless of digests")
+    parser.add_argument("--skip-download", action="store_true", help="build from the files already in data/")
+    parser.add_argument("--dry-run", action="store_true", help="print stage status and exit")
+    parser.add_argument("--stream", action="store_true", help="stream rows straight to JSON (flat memory)")
+    args = parser.parse_args(argv)
+
+    # download_delegated works with paths relative to the repo root.
+    os.chdir(ROOT_DIR)
+    ctx = {}
+    if args.dry_run:
+        for name, status in plan(make_stages(args.skip_download), ctx):
+            print(f"[*] {name:<14} {status}")
+        return 0
+    try:
+        ran = run_pipeline(make_stages(args.skip_download, args.stream), ctx, force=args.force)
+    except Exception as e:
+        print(f"\n[X] Pipeline failed: {e}")
+        import traceback
+        traceback.print_exc()
+        emit_metrics("pipeline", METRICS_DIR, history_file=None)
+        return 1
+    finally:
+        # A streamed build whose payload turned out unchanged leaves its staged files behind.
+        shutil.rmtree(STAGED_DIR, ignore_errors=True)
+
+    # Any digest-tracked stage that ran rewrote .pipeline_state.json, which must be
+    # committed too or the next (fresh-checkout) run would redo the work.
+    changed = bool(set(ran) - {"download"})
+    _report_changed(changed)
+    print(f"\n[+] Pipeline done. Stages run: {', '.join(ran) or 'none'}; changed={changed}")
+    emit_metrics("pipeline", METRICS_DIR, history_file=HISTORY_FILE if changed else None)
+
+    downloads = ctx.get("downloads")
+    if downloads is not None and not any(downloads.values()):
+        print("\n[X] No files were downloaded successfully.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
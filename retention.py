@@ -0,0 +1,146 @@
+"""Age-tiered retention for timestamped workbook versions.
+
+Versions are `<output_name>_YYYYMMDD_HHMMSS.xlsx` in data/ and data/archive/.
+They are ordered by the timestamp in the filename, never by mtime (a git
+checkout gives every file the same mtime). Per output_name, newest first:
+
+- the newest `min_keep` versions are always kept;
+- versions up to `keep_all_days` old are all kept (daily tier);
+- up to `weekly_days` old, the newest version of each ISO week is kept;
+- older than that, the newest version of each calendar month is kept
+  (for `monthly_days`, or forever when it is None).
+
+Everything else is dropped. download_delegated applies the policy to the
+archive after each new version only when FILE_MANAGEMENT['thin_archive'] is
+set (off by default); this module is also a CLI that reports what the policy
+would reclaim:
+
+    python retention.py            # dry run: list drops and bytes reclaimed
+    python retention.py --apply    # delete them
+"""
+import argparse
+import datetime as dt
+import os
+import re
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+DATA_DIR = ROOT_DIR / "data"
+ARCHIVE_DIR = DATA_DIR / "archive"
+
+DEFAULT_POLICY = {
+    'min_keep': 2,
+    'keep_all_days': 14,
+    'weekly_days': 183,
+    'monthly_days': None,
+}
+
+_VERSION_RE = re.compile(r"^(?P<name>.+)_(?P<ts>\d{8}_\d{6})\.xlsx$")
+
+
+def parse_version(path) -> tuple[str, dt.datetime] | None:
+    """('Postdocs', datetime) for 'Postdocs_20260505_100206.xlsx'; None for other files."""
+    m = _VERSION_RE.match(Path(path).name)
+    if not m:
+        return None
+    try:
+        return m.group("name"), dt.datetime.strptime(m.group("ts"), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def version_sort_key(path) -> str:
+    """Sort key by filename timestamp ('YYYYMMDD_HHMMSS' sorts lexically); '' if unparseable."""
+    parsed = parse_version(path)
+    return parsed[1].strftime("%Y%m%d_%H%M%S") if parsed else ""
+
+
+def find_versions(dirs=(DATA_DIR, ARCHIVE_DIR)) -> dict[str, list[tuple[dt.datetime, Path]]]:
+    """{output_name: [(timestamp, path), ...]} newest first, across `dirs`."""
+    out = {}
+    for d in dirs:
+        if not Path(d).is_dir():
+            continue
+        for p in Path(d).glob("*.xlsx"):
+            parsed = parse_version(p)
+            if parsed:
+                out.setdefault(parsed[0], []).append((parsed[1], p))
+    for versions in out.values():
+        versions.sort(key=lambda v: v[0], reverse=True)
+    return out
+
+
+def plan(versions: list[tuple[dt.datetime, Path]], now: dt.datetime, policy: dict = DEFAULT_POLICY):
+    """Split one output_name's versions (newest first) into keep / drop.
+
+    Returns (keep, drop), each a list of (path, reason).
+    """
+    keep, drop = [], []
+    seen_buckets = set()
+    for i, (ts, path) in enumerate(versions):
+        age_days = (now - ts).total_seconds() / 86400
+        if i < policy['min_keep']:
+            keep.append((path, "newest"))
+            continue
+        if age_days <= policy['keep_all_days']:
+            keep.append((path, "daily"))
+            continue
+        if age_days <= policy['weekly_days']:
+            year, week, _ = ts.isocalendar()
+            bucket, tier = ("week", year, week), "weekly"
+        elif policy['monthly_days'] is None or age_days <= policy['monthly_days']:
+            bucket, tier = ("month", ts.year, ts.month), "monthly"
+        else:
+            drop.append((path, "expired"))
+            continue
+        if bucket in seen_buckets:
+            drop.append((path, f"thinned ({tier})"))
+        else:
+            seen_buckets.add(bucket)
+            keep.append((path, tier))
+    return keep, drop
+
+
+def apply_retention(output_name: str | None = None, policy: dict = DEFAULT_POLICY,
+                    dry_run: bool = True, dirs=(DATA_DIR, ARCHIVE_DIR), now: dt.datetime | None = None) -> dict:
+    """Apply (or, with dry_run, only report) the policy for one or all output_names.
+
+    Returns {"files": n_dropped, "bytes": bytes_reclaimed, "drops": [(path, reason), ...]}.
+    """
+    now = now or dt.datetime.now()
+    result = {"files": 0, "bytes": 0, "drops": []}
+    for name, versions in sorted(find_versions(dirs).items()):
+        if output_name is not None and name != output_name:
+            continue
+        _, drop = plan(versions, now, policy)
+        for path, reason in drop:
+            size = path.stat().st_size
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"    [!] Could not delete {path.name}: {e}")
+                    continue
+            result["files"] += 1
+            result["bytes"] += size
+            result["drops"].append((path, reason))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Age-tiered retention for archived workbook versions.")
+    parser.add_argument("--apply", action="store_true", help="delete instead of only reporting")
+    parser.add_argument("--name", help="only this output_name (e.g. 'Postdocs')")
+    args = parser.parse_args(argv)
+
+    result = apply_retention(args.name, dry_run=not args.apply)
+    for path, reason in result["drops"]:
+        print(f"[*] {'Deleted' if args.apply else 'Would delete'}: {path.relative_to(ROOT_DIR)}  [{reason}]")
+    verb = "Reclaimed" if args.apply else "Would reclaim"
+    print(f"[+] {verb} {result['bytes'] / 1024 / 1024:.1f} MB in {result['files']} file(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Expected-schema registry and header validation for the source workbooks.
+
+Extractors in build_stats.py look columns up by exact header text, so a
+renamed column upstream would silently turn into None. Every sheet they read
+is registered here with the columns it needs. `check_header` compares a
+sheet's header row against the registry:
+
+- exact matches pass;
+- headers that differ only in case or whitespace (e.g. the double space in
+  "1st Author PhD  Publications") are aliased to the expected name;
+- anything else is missing, reported with difflib suggestions, and fails
+  the build before any rows are parsed.
+
+Each sheet also gets a header fingerprint (sha256 of its non-empty headers,
+in order) so added or reordered columns show up in the validation report
+even when nothing required is missing.
+"""
+import difflib
+import hashlib
+import re
+from pathlib import Path
+
+# workbook output_name -> sheet name -> required column headers
+EXPECTED_SCHEMAS = {
+    "Cohort_1_11_Demographics": {
+        "Fellows": [
+            "Unique ID", "First Name", "Surname", "Gender", "Cohort", "Nationality",
+            "Institution of employment at registration", "Institution of registration",
+            "Year of admission into CARTA", "Date of PhD registration",
+            "Date of completion(Defended/Graduated)",
+            "Current PhD Status ( Completed/Defended/In Progress)",
+            "Time to completion since PhD registration (Months)",
+            "Promotion event", "Other responsibilities",
+            "No of Publications During PhD", "No of Publications after PhD",
+            "1st Author PhD  Publications", "Last Author PhD Publications",
+            "1st Author Graduate  Publications", "Last Author  Graduate Publications",
+            "Terminated", "Fellow Funder",
+            "Month/ Year JAS1", "Month/ Year JAS2", "Month/ Year JAS3", "Month/ Year JAS4",
+        ],
+    },
+    "Postdocs": {
+        "Post Doc": [
+            "Unique ID", "Name of Awardee", "Sex",
+            "Institution of employment at the time of award", "Host Country", "Award Type",
+            "Year of Award", "Year of Completion", "Status (Active/Completed", "Funder",
+        ],
+    },
+    "Extra Grants": {
+        "Extra Grants": [
+            "Total amount in $", "Sex", "Cohort Number", "Institution of employment at registration",
+            "Type of Grant", "Year", "Award date", "Name of Funder", "Duration of Funding (in months)",
+        ],
+    },
+    "Institutionalization": {
+        sheet: [
+            "Full Name", "Intervention", "Type of training",
+            "Principal duty at event (Participant/Facilitator)", "Sex", "Year",
+            "Event Start Date", "Associated institution", "CARTA Fellow (Yes/No)",
+        ]
+        for sheet in ("CARTA Organized", "Local and Institutional ToTs")
+    },
+}
+
+_VERSION_SUFFIX = re.compile(r"_(latest|\d{8}_\d{6})$")
+
+
+class SchemaError(ValueError):
+    """A source sheet is missing, or lacks columns the extractors need."""
+
+
+def output_name_of(xlsx_path: Path) -> str:
+    """'Postdocs_latest.xlsx' / 'Postdocs_20260505_100206.xlsx' -> 'Postdocs'."""
+    return _VERSION_SUFFIX.sub("", Path(xlsx_path).stem)
+
+
+def expected_sheets(xlsx_path: Path) -> dict[str, list[str]]:
+    """Registered sheets (and their required columns) for a workbook; {} if unregistered."""
+    return EXPECTED_SCHEMAS.get(output_name_of(xlsx_path), {})
+
+
+def normalize_header(h: str) -> str:
+    return " ".join(str(h).split()).lower()
+
+
+def header_fingerprint(header: list[str]) -> str:
+    return hashlib.sha256("\x1f".join(h for h in header if h).encode("utf-8")).hexdigest()[:16]
+
+
+def check_header(xlsx_path: Path, sheet_name: str, header: list[str]) -> dict:
+    """Validate one sheet's header row against the registry.
+
+    Returns a report dict; `aliases` maps actual header -> expected name for
+    case/whitespace-only differences, and `ok` is False if anything required
+    is missing. Unregistered sheets are fingerprinted but always ok.
+    """
+    required = expected_sheets(xlsx_path).get(sheet_name, [])
+    present = [h for h in header if h]
+    present_set = set(present)
+    by_normalized = {normalize_header(h): h for h in present}
+
+    missing, aliases, suggestions = [], {}, {}
+    for col in required:
+        if col in present_set:
+            continue
+        actual = by_normalized.get(normalize_header(col))
+        if actual is not None:
+            aliases[actual] = col
+            continue
+        missing.append(col)
+        suggestions[col] = difflib.get_close_matches(col, present, n=3, cutoff=0.6)
+
+    return {
+        "file": Path(xlsx_path).name,
+        "sheet": sheet_name,
+        "fingerprint": header_fingerprint(header),
+        "columns": len(present),
+        "registered": bool(required),
+        "missing": missing,
+        "aliases": aliases,
+        "suggestions": suggestions,
+        "ok": not missing,
+    }
+
+
+def describe_failure(report: dict) -> str:
+    if report.get("sheet_missing"):
+        return f"{report['file']}: sheet '{report['sheet']}' missing. Have: {report['sheet_missing']}"
+    parts = []
+    for col in report["missing"]:
+        hint = report["suggestions"].get(col)
+        parts.append(f"'{col}'" + (f" (did you mean {', '.join(repr(s) for s in hint)}?)" if hint else ""))
+    return f"{report['file']} / {report['sheet']}: missing {', '.join(parts)}"
@@ -0,0 +1,90 @@
+import datetime as dt
+from pathlib import Path
+
+from retention import DEFAULT_POLICY, apply_retention, plan
+
+# A Thursday, so a few hours either side of "N days ago" stays in one ISO week.
+NOW = dt.datetime(2026, 6, 18, 12, 0, 0)
+
+
+def version(when: dt.datetime, name: str = "Postdocs") -> tuple[dt.datetime, Path]:
+    return when, Path(f"{name}_{when:%Y%m%d_%H%M%S}.xlsx")
+
+
+def aged(*days: float) -> list[tuple[dt.datetime, Path]]:
+    """Versions `days` old relative to NOW, newest first as plan() expects."""
+    return [version(NOW - dt.timedelta(days=d)) for d in sorted(days)]
+
+
+def reasons(versions, policy=DEFAULT_POLICY, now=NOW) -> list[str]:
+    keep, drop = plan(versions, now, policy)
+    by_path = {p: r for p, r in keep + drop}
+    return [by_path[p] for _, p in versions]
+
+
+def test_min_keep_overrides_every_tier():
+    policy = {**DEFAULT_POLICY, "monthly_days": 365}
+    assert reasons(aged(400, 401, 402), policy) == ["newest", "newest", "expired"]
+
+
+def test_min_keep_from_policy():
+    policy = {**DEFAULT_POLICY, "min_keep": 4}
+    assert reasons(aged(300, 301, 302, 303), policy) == ["newest"] * 4
+
+
+def test_everything_within_keep_all_days_is_kept():
+    assert reasons(aged(0, 1, 2, 2.1, 2.2, 13.9, 14)) == ["newest", "newest"] + ["daily"] * 5
+
+
+def test_weekly_tier_starts_after_keep_all_days():
+    # 14.25 and 14.5 days ago are both Thursday 2026-06-04: one ISO week.
+    assert reasons(aged(0, 1, 14, 14.25, 14.5)) == [
+        "newest", "newest", "daily", "weekly", "thinned (weekly)"]
+
+
+def test_weekly_bucket_is_the_iso_week():
+    # 2025-12-29 (Mon) and 2026-01-02 (Fri) are both in ISO week 2026-W01;
+    # 2025-12-28 (Sun) is in 2025-W52.
+    versions = [version(dt.datetime(2026, 1, 2, 8)), version(dt.datetime(2025, 12, 29, 8)),
+                version(dt.datetime(2025, 12, 28, 8))]
+    now = dt.datetime(2026, 2, 1, 12)
+    assert reasons(versions, {**DEFAULT_POLICY, "min_keep": 0}, now) == [
+        "weekly", "thinned (weekly)", "weekly"]
+
+
+def test_monthly_tier_starts_after_weekly_days():
+    # 184 and 185 days ago are 2025-12-16 and 2025-12-15: same calendar month.
+    assert reasons(aged(0, 1, 183, 184, 185)) == [
+        "newest", "newest", "weekly", "monthly", "thinned (monthly)"]
+
+
+def test_monthly_bucket_is_the_calendar_month():
+    versions = [version(dt.datetime(2025, 3, d, 8)) for d in (31, 20, 1)]
+    versions.append(version(dt.datetime(2025, 2, 28, 8)))
+    assert reasons(versions, {**DEFAULT_POLICY, "min_keep": 0}) == [
+        "monthly", "thinned (monthly)", "thinned (monthly)", "monthly"]
+
+
+def test_monthly_days_none_keeps_one_per_month_forever():
+    versions = [version(dt.datetime(y, 1, 10, 8)) for y in (2020, 2015, 2010)]
+    assert reasons(versions, {**DEFAULT_POLICY, "min_keep": 0}) == ["monthly"] * 3
+
+
+def test_monthly_days_expires_older_versions():
+    policy = {**DEFAULT_POLICY, "min_keep": 0, "monthly_days": 365}
+    assert reasons(aged(300, 366), policy) == ["monthly", "expired"]
+
+
+def test_apply_retention_only_deletes_when_not_dry_run(tmp_path):
+    files = []
+    for _, path in aged(0, 1, 30, 30.1):
+        (tmp_path / path.name).write_bytes(b"x" * 10)
+        files.append(tmp_path / path.name)
+
+    result = apply_retention("Postdocs", dry_run=True, dirs=(tmp_path,), now=NOW)
+    assert result["files"] == 1 and result["bytes"] == 10
+    assert all(f.exists() for f in files)
+
+    result = apply_retention("Postdocs", dry_run=False, dirs=(tmp_path,), now=NOW)
+    assert [p.name for p, _ in result["drops"]] == [files[3].name]
+    assert not files[3].exists() and all(f.exists() for f in files[:3])
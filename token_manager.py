@@ -0,0 +1,158 @@
+"""Access-token caching, proactive refresh and refresh-token persistence.
+
+`TokenManager` wraps a `fetch(refresh_token)` callable that talks to the token
+endpoint and returns the raw token response (`access_token`, `expires_in` and,
+for delegated flows, possibly a rotated `refresh_token`). It:
+
+- caches the access token with its expiry, in memory and in a small on-disk
+  cache (TOKEN_CACHE_FILE, default `.token_cache.json`, mode 0600) so every
+  file and every script in the same run reuses one token;
+- refreshes proactively once the token is within `refresh_margin` seconds of
+  expiry, so long runs never send an expired token halfway through;
+- hands rotated refresh tokens to a credential store (CREDENTIAL_STORE) and
+  keeps using the newest one for the rest of the run.
+
+CREDENTIAL_STORE values:
+    file[:<path>]  (default) write the token to <path>, default
+                   `.refresh_token` (mode 0600); later runs read it back.
+    github[:<path>] `gh secret set REFRESH_TOKEN` (needs GH_TOKEN with
+                   secrets:write; the token goes over stdin, never argv);
+                   falls back to the file at <path> if that fails, which
+                   later runs read back like the `file` store.
+    none           do not persist; only log that a new token was issued.
+
+A stored token is only used while the REFRESH_TOKEN it replaced is still the
+one in the environment. Once an operator sets a new REFRESH_TOKEN (e.g. after
+the stored one was revoked), the environment value wins again.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_FILE = ROOT_DIR / ".token_cache.json"
+DEFAULT_REFRESH_TOKEN_FILE = ROOT_DIR / ".refresh_token"
+REFRESH_MARGIN_SECONDS = 300
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_private(path: Path, text: str):
+    """Write `text` to `path` readable only by the current user."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class CredentialStore:
+    """Persists rotated refresh tokens according to CREDENTIAL_STORE."""
+
+    def __init__(self, spec: str | None = None):
+        spec = (spec if spec is not None else os.environ.get("CREDENTIAL_STORE", "file")).strip() or "file"
+        self.kind, _, arg = spec.partition(":")
+        self.path = Path(arg) if arg else DEFAULT_REFRESH_TOKEN_FILE
+
+    def load(self) -> dict | None:
+        """Return {"refresh_token", "env_sha256"} persisted in the file (also the
+        github store's fallback), or None."""
+        if self.kind == "none" or not self.path.exists():
+            return None
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return data if isinstance(data, dict) and data.get("refresh_token") else None
+
+    def save(self, refresh_token: str, env_sha256: str | None = None):
+        """Persist `refresh_token`; `env_sha256` fingerprints the REFRESH_TOKEN env
+        value it superseded, so a later change to that env value takes precedence."""
+        if self.kind == "none":
+            print("[!] New refresh token issued (CREDENTIAL_STORE=none, not persisted)")
+            return
+        if self.kind == "github":
+            try:
+                subprocess.run(["gh", "secret", "set", "REFRESH_TOKEN"], input=refresh_token,
+                               text=True, check=True, capture_output=True, timeout=60)
+                print("[+] New refresh token stored in GitHub secret REFRESH_TOKEN")
+                return
+            except Exception as e:
+                print(f"[!] Could not update GitHub secret ({e}); falling back to file store")
+        _write_private(self.path, json.dumps({"refresh_token": refresh_token, "env_sha256": env_sha256}))
+        print(f"[+] New refresh token stored in: {self.path}")
+
+
+class TokenManager:
+    """Caches an access token and refreshes it before it expires."""
+
+    def __init__(self, fetch, refresh_token: str | None = None, cache_key: str = "default",
+                 store: CredentialStore | None = None, cache_file: Path | None = None,
+                 refresh_margin: int = REFRESH_MARGIN_SECONDS):
+        self._fetch = fetch
+        self.store = store or CredentialStore()
+        self._env_sha256 = _sha256(refresh_token) if refresh_token else None
+        self.refresh_token = refresh_token
+        stored = self.store.load()
+        if stored:
+            if refresh_token is None or stored.get("env_sha256") == self._env_sha256:
+                self.refresh_token = stored["refresh_token"]
+            else:
+                print("[*] REFRESH_TOKEN changed since the stored token was saved - using the environment value")
+        # Never key the cache on the raw secret itself.
+        self.cache_key = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()[:16]
+        cache_env = os.environ.get("TOKEN_CACHE_FILE", "").strip()
+        self.cache_file = cache_file or (Path(cache_env) if cache_env else DEFAULT_CACHE_FILE)
+        self.refresh_margin = refresh_margin
+        self._access_token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            entry = json.loads(self.cache_file.read_text(encoding="utf-8")).get(self.cache_key)
+        except (OSError, ValueError):
+            return
+        if entry:
+            self._access_token = entry.get("access_token")
+            self._expires_at = float(entry.get("expires_at", 0))
+
+    def _save_cache(self):
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        data[self.cache_key] = {"access_token": self._access_token, "expires_at": self._expires_at}
+        try:
+            _write_private(self.cache_file, json.dumps(data))
+        except OSError as e:
+            print(f"[!] Could not write token cache {self.cache_file}: {e}")
+
+    def seconds_left(self) -> float:
+        return self._expires_at - time.time()
+
+    def get(self) -> str:
+        """Return a valid access token, refreshing if it expires within the margin."""
+        with self._lock:
+            if self._access_token and self.seconds_left() > self.refresh_margin:
+                return self._access_token
+            if self._access_token:
+                print(f"[*] Access token expires in {max(self.seconds_left(), 0):.0f}s - refreshing")
+            token_data = self._fetch(self.refresh_token)
+            self._access_token = token_data["access_token"]
+            self._expires_at = time.time() + int(token_data.get("expires_in", 3600))
+            new_refresh = token_data.get("refresh_token")
+            if new_refresh and new_refresh != self.refresh_token:
+                self.refresh_token = new_refresh
+                self.store.save(new_refresh, self._env_sha256)
+            self._save_cache()
+            return self._access_token
+
+    def headers(self, **extra) -> dict:
+        """Graph request headers carrying a currently valid bearer token."""
+        return {'Authorization': f'Bearer {self.get()}', **extra}